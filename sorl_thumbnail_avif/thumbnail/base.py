@@ -1,7 +1,15 @@
+import logging
+
+from sorl.thumbnail import default
 from sorl.thumbnail.base import ThumbnailBackend
 from sorl.thumbnail.conf import settings
 from sorl.thumbnail.conf import defaults as default_settings
 from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import DummyImageFile
+
+from sorl_thumbnail_avif.thumbnail.images import AvifImageFile
+
+logger = logging.getLogger(__name__)
 
 
 EXTENSIONS = {
@@ -12,27 +20,141 @@ EXTENSIONS = {
     "AVIF": "avif",
 }
 
+FORMATS = {
+    ".avif": "AVIF",
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".png": "PNG",
+    ".gif": "GIF",
+    ".webp": "WEBP",
+}
+
 
 class AvifThumbnail(ThumbnailBackend):
+    def file_extension(self, source):
+        # AvifImageFile works its extension out once
+        ext = getattr(source, "ext", None)
+        if ext is None:
+            return super().file_extension(source)
+        return ext
+
     def _get_format(self, source):
-        file_extension = self.file_extension(source)
-
-        if file_extension == ".avif":
-            return "AVIF"
-        elif file_extension == ".jpg" or file_extension == ".jpeg":
-            return "JPEG"
-        elif file_extension == ".png":
-            return "PNG"
-        elif file_extension == ".gif":
-            return "GIF"
-        elif file_extension == ".webp":
-            return "WEBP"
+        format_ = FORMATS.get(self.file_extension(source))
+        if format_ is not None:
+            return format_
+
+        from django.conf import settings
+
+        return getattr(settings, "THUMBNAIL_FORMAT", default_settings.THUMBNAIL_FORMAT)
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        """
+        Returns thumbnail as an ImageFile instance for file with geometry and
+        options given, see ``get_thumbnails``.
+        """
+        if not file_:
+            raise ValueError("falsey file_ argument in get_thumbnail()")
+        return self.get_thumbnails(file_, [geometry_string], **options)[0]
+
+    def get_thumbnails(self, file_, geometry_strings, **options):
+        """
+        Like ``get_thumbnail``, but for several geometries of the same file.
+        Returns a list of thumbnails in the order of ``geometry_strings``, the
+        source image is opened at most once for all the missing ones.
+        """
+        logger.debug("Getting thumbnails for file [%s] at %s", file_, geometry_strings)
+
+        if file_:
+            source = AvifImageFile(file_)
         else:
-            from django.conf import settings
+            raise ValueError("falsey file_ argument in get_thumbnails()")
+
+        self._set_default_options(source, options)
+
+        # thumbnails by name, geometries that map to the same name share one
+        names = []
+        thumbnails = {}
+        uncached = {}
+        missing = {}
+        for geometry_string in geometry_strings:
+            name = self._get_thumbnail_filename(source, geometry_string, options)
+            names.append(name)
+            if name in thumbnails:
+                continue
+
+            thumbnail = AvifImageFile(name, default.storage)
+            cached = default.kvstore.get(thumbnail)
+
+            if cached:
+                thumbnails[name] = cached
+                continue
+
+            thumbnails[name] = thumbnail
+            uncached[name] = thumbnail
+            # We have to check exists() because the Storage backend does not
+            # overwrite in some implementations.
+            if settings.THUMBNAIL_FORCE_OVERWRITE or not thumbnail.exists():
+                missing[name] = geometry_string
+
+        if missing:
+            try:
+                source_image = default.engine.get_image(source)
+            except Exception as e:
+                logger.exception(e)
+                for name, geometry_string in missing.items():
+                    if settings.THUMBNAIL_DUMMY:
+                        thumbnails[name] = DummyImageFile(geometry_string)
+                    else:
+                        logger.warning(
+                            "Remote file [%s] at [%s] does not exist",
+                            file_,
+                            geometry_string,
+                        )
+                # thumbnails already in storage are still registered, like
+                # get_thumbnail would for each of them
+                uncached = {
+                    name: thumbnail
+                    for name, thumbnail in uncached.items()
+                    if name not in missing
+                }
+            else:
+                options["image_info"] = default.engine.get_image_info(source_image)
+                size = default.engine.get_image_size(source_image)
+                source.set_size(size)
+
+                try:
+                    for name, geometry_string in missing.items():
+                        thumbnail = uncached[name]
+                        self._create_thumbnail(
+                            source_image, geometry_string, options, thumbnail
+                        )
+                        self._create_alternative_resolutions(
+                            source_image, geometry_string, options, thumbnail.name
+                        )
+                finally:
+                    default.engine.cleanup(source_image)
+
+        if uncached:
+            default.kvstore.get_or_set(source)
+            for thumbnail in uncached.values():
+                default.kvstore.set(thumbnail, source)
+        return [thumbnails[name] for name in names]
+
+    def _set_default_options(self, source, options):
+        # mirrors the option handling in sorl's ThumbnailBackend.get_thumbnail,
+        # keep the two in sync
+
+        # preserve image filetype
+        if settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", self._get_format(source))
+
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
 
-            return getattr(
-                settings, "THUMBNAIL_FORMAT", default_settings.THUMBNAIL_FORMAT
-            )
+        for key, attr in self.extra_options:
+            value = getattr(settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
 
     def _get_thumbnail_filename(self, source, geometry_string, options):
         key = tokey(source.key, geometry_string, serialize(options))
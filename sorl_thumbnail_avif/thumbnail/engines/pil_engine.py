@@ -1,17 +1,25 @@
+import functools
 from io import BytesIO
 from sorl.thumbnail.engines.pil_engine import Engine
 
 from PIL import Image, ImageFile
 from PIL.ImageFilter import GaussianBlur
-import pillow_avif  # noqa: F401
+
+
+@functools.cache
+def _register_avif():
+    # importing the plugin registers the AVIF codec with Pillow
+    import pillow_avif  # noqa: F401
 
 
 class AvifEngine(Engine):
     def get_image(self, source):
+        _register_avif()
         buffer = BytesIO(source.read())
         return Image.open(buffer)
 
     def is_valid_image(self, raw_data):
+        _register_avif()
         buffer = BytesIO(raw_data)
         try:
             trial_image = Image.open(buffer)
@@ -48,7 +56,9 @@ class AvifEngine(Engine):
 
         raw_data = None
 
-        if format_ == "JPEG" and progressive:
+        if format_ == "AVIF":
+            _register_avif()
+        elif format_ == "JPEG" and progressive:
             params["progressive"] = True
         try:
             # Do not save unnecessary exif data for smaller thumbnail size
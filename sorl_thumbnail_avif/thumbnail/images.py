@@ -0,0 +1,24 @@
+import os
+from functools import cached_property
+
+from sorl.thumbnail.images import ImageFile
+
+
+class AvifImageFile(ImageFile):
+    @cached_property
+    def ext(self):
+        return os.path.splitext(self.name)[1].lower()
+
+    def exists(self):
+        from django.conf import settings
+
+        if getattr(settings, "THUMBNAIL_EXISTS_LOCAL_FIRST", False):
+            # storages on the local filesystem can answer with a single stat
+            try:
+                path = self.storage.path(self.name)
+            except NotImplementedError:
+                pass
+            else:
+                return os.path.exists(path)
+
+        return super().exists()
@@ -0,0 +1,4 @@
+from sorl_thumbnail_avif.thumbnail.kvstores.cached_db_kvstore import (
+    AvifKVStore,
+    request_cache,
+)
@@ -0,0 +1,109 @@
+from contextlib import contextmanager
+
+from asgiref.local import Local
+
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.helpers import deserialize
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+_local = Local()
+
+
+@contextmanager
+def request_cache():
+    """
+    Memoizes raw key value store lookups made inside the block, so a key is
+    fetched at most once. ``KVStoreRequestCacheMiddleware`` opens one per
+    request.
+    """
+    if getattr(_local, "memo", None) is not None:
+        # already memoizing for an enclosing block
+        yield
+        return
+
+    _local.memo = {}
+    try:
+        yield
+    finally:
+        del _local.memo
+
+
+class AvifKVStore(KVStore):
+    def get_many(self, image_files):
+        """
+        Gets all ``image_files`` from store in one round-trip. Returns a dict
+        keyed by ``image_file.key``, with ``None`` for the ones not found.
+        """
+        return self._get_many([image_file.key for image_file in image_files])
+
+    def clear(self, delete_thumbnails=False):
+        super().clear(delete_thumbnails)
+        memo = getattr(_local, "memo", None)
+        if memo is not None:
+            memo.clear()
+
+    def _get_many(self, keys, identity="image"):
+        """
+        Deserializing, prefix wrapper for _get_many_raw
+        """
+        raw_keys = {add_prefix(key, identity): key for key in keys}
+        values = self._get_many_raw(list(raw_keys))
+
+        result = {}
+        for raw_key, key in raw_keys.items():
+            value = values.get(raw_key)
+            if not value:
+                result[key] = None
+            elif identity == "image":
+                result[key] = deserialize_image_file(value)
+            else:
+                result[key] = deserialize(value)
+        return result
+
+    def _get_raw(self, key):
+        memo = getattr(_local, "memo", None)
+        if memo is None:
+            return super()._get_raw(key)
+        if key not in memo:
+            memo[key] = super()._get_raw(key)
+        return memo[key]
+
+    def _get_many_raw(self, keys):
+        memo = getattr(_local, "memo", None)
+        if memo is None:
+            return self._fetch_many_raw(keys)
+        missing = [key for key in keys if key not in memo]
+        if missing:
+            values = self._fetch_many_raw(missing)
+            for key in missing:
+                memo[key] = values.get(key)
+        return {key: memo[key] for key in keys if memo[key] is not None}
+
+    def _fetch_many_raw(self, keys):
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(
+                KVStoreModel.objects.filter(key__in=missing).values_list("key", "value")
+            )
+            # we set the cache to prevent further db lookups
+            fetched = {key: found.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(fetched, settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(fetched)
+        return {key: value for key, value in values.items() if value != EMPTY_VALUE}
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        memo = getattr(_local, "memo", None)
+        if memo is not None:
+            memo[key] = value
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        memo = getattr(_local, "memo", None)
+        if memo is not None:
+            for key in keys:
+                memo.pop(key, None)
@@ -0,0 +1,14 @@
+from sorl_thumbnail_avif.thumbnail.kvstores import request_cache
+
+
+class KVStoreRequestCacheMiddleware:
+    """
+    Memoizes ``AvifKVStore`` lookups for the duration of each request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_cache():
+            return self.get_response(request)
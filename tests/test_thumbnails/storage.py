@@ -11,15 +11,29 @@ class MockLoggingHandler(logging.Handler):
         super().__init__(*args, **kwargs)
 
     def emit(self, record):
-        self.messages[record.levelname.lower()].append(record.getMessage())
+        # getMessage() only does more than str() when there are args to merge
+        msg = record.getMessage() if record.args else str(record.msg)
+        self._map[record.levelno].append(msg)
 
     def reset(self):
+        self.debug = []
+        self.info = []
+        self.warning = []
+        self.error = []
+        self.critical = []
         self.messages = {
-            "debug": [],
-            "info": [],
-            "warning": [],
-            "error": [],
-            "critical": [],
+            "debug": self.debug,
+            "info": self.info,
+            "warning": self.warning,
+            "error": self.error,
+            "critical": self.critical,
+        }
+        self._map = {
+            logging.DEBUG: self.debug,
+            logging.INFO: self.info,
+            logging.WARNING: self.warning,
+            logging.ERROR: self.error,
+            logging.CRITICAL: self.critical,
         }
 
 
@@ -28,55 +42,57 @@ slog = logging.getLogger("slog")
 
 class TestStorageMixin:
     def open(self, name, *args, **kwargs):
-        slog.debug("open: %s" % name)
+        slog.debug("open: %s", name)
         return super().open(name, *args, **kwargs)
 
     def save(self, name, *args, **kwargs):
-        slog.debug("save: %s" % name)
+        slog.debug("save: %s", name)
         return super().save(name, *args, **kwargs)
 
     def get_valid_name(self, name, *args, **kwargs):
-        slog.debug("get_valid_name: %s" % name)
+        slog.debug("get_valid_name: %s", name)
         return super().get_valid_name(name, *args, **kwargs)
 
     def get_available_name(self, name, *args, **kwargs):
-        slog.debug("get_available_name: %s" % name)
+        slog.debug("get_available_name: %s", name)
         return super().get_available_name(name, *args, **kwargs)
 
     def path(self, name, *args, **kwargs):
-        # slog.debug('path: %s' % name)
+        # slog.debug("path: %s", name)
         return super().path(name, *args, **kwargs)
 
     def delete(self, name, *args, **kwargs):
-        slog.debug("delete: %s" % name)
+        slog.debug("delete: %s", name)
         return super().delete(name, *args, **kwargs)
 
     def exists(self, name, *args, **kwargs):
-        slog.debug("exists: %s" % name)
+        if slog.isEnabledFor(logging.DEBUG):
+            slog.debug("exists: %s", name)
         return super().exists(name, *args, **kwargs)
 
     def listdir(self, name, *args, **kwargs):
-        slog.debug("listdir: %s" % name)
+        slog.debug("listdir: %s", name)
         return super().listdir(name, *args, **kwargs)
 
     def size(self, name, *args, **kwargs):
-        slog.debug("size: %s" % name)
+        if slog.isEnabledFor(logging.DEBUG):
+            slog.debug("size: %s", name)
         return super().size(name, *args, **kwargs)
 
     def url(self, name, *args, **kwargs):
-        # slog.debug('url: %s' % name)
+        # slog.debug("url: %s", name)
         return super().url(name, *args, **kwargs)
 
     def accessed_time(self, name, *args, **kwargs):
-        slog.debug("accessed_time: %s" % name)
+        slog.debug("accessed_time: %s", name)
         return super().accessed_time(name, *args, **kwargs)
 
     def created_time(self, name, *args, **kwargs):
-        slog.debug("created_time: %s" % name)
+        slog.debug("created_time: %s", name)
         return super().created_time(name, *args, **kwargs)
 
     def modified_time(self, name, *args, **kwargs):
-        slog.debug("modified_time: %s" % name)
+        slog.debug("modified_time: %s", name)
         return super().modified_time(name, *args, **kwargs)
 
 
@@ -1,9 +1,12 @@
 import os
 import platform
+import re
 import shutil
 import sys
+import tempfile
 import unittest
-from io import StringIO
+from io import BytesIO
+from unittest import mock
 
 from django.test import TestCase
 from django.test.utils import override_settings
@@ -12,72 +15,87 @@ import pillow_avif  # noqa: F401
 import pytest
 
 from sorl.thumbnail import default, delete, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend as SorlThumbnailBackend
 from sorl.thumbnail.conf import settings
 from sorl.thumbnail.helpers import get_module_class
 from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
 
 from sorl_thumbnail_avif.thumbnail import AvifThumbnail as ThumbnailBackend
+from sorl_thumbnail_avif.thumbnail.engines import AvifEngine
+from sorl_thumbnail_avif.thumbnail.images import AvifImageFile
+from sorl_thumbnail_avif.thumbnail.kvstores import request_cache
 
-from .models import Item
-from .utils import BaseTestCase, FakeFile, same_open_fd_count
+from .utils import AvifKVStoreMixin, BaseTestCase, FakeFile, same_open_fd_count
 
 
-class BackendTest(BaseTestCase):
-    @pytest.mark.django_db
-    def test_delete(self):
-        im1 = Item.objects.get(image="100x100.avif").image
-        im2 = Item.objects.get(image="500x500.avif").image
-        default.kvstore.get_or_set(ImageFile(im1))
+def _encode_input_image():
+    buffer = BytesIO()
+    Image.new("L", (666, 666)).save(buffer, format="AVIF")
+    return buffer.getvalue()
 
-        # exists in kvstore and in storage
-        self.assertTrue(bool(default.kvstore.get(ImageFile(im1))))
-        self.assertTrue(ImageFile(im1).exists())
 
-        # delete
-        delete(im1)
-        self.assertFalse(bool(default.kvstore.get(ImageFile(im1))))
-        self.assertFalse(ImageFile(im1).exists())
+INPUT_IMAGE = _encode_input_image()
+
 
-        default.kvstore.get_or_set(ImageFile(im2))
+class BackendTest(AvifKVStoreMixin, BaseTestCase):
+    @pytest.mark.django_db
+    def test_delete(self):
+        im1 = self.items["100x100.avif"].image
+        im2 = self.items["500x500.avif"].image
+        imf1 = AvifImageFile(im1)
+        imf2 = AvifImageFile(im2)
 
-        # exists in kvstore and in storage
-        self.assertTrue(bool(default.kvstore.get(ImageFile(im2))))
-        self.assertTrue(ImageFile(im2).exists())
+        def snapshot():
+            """(in kvstore, in storage) for each image"""
+            cached = default.kvstore.get_many([imf1, imf2])
+            return [(bool(cached[imf.key]), imf.exists()) for imf in (imf1, imf2)]
 
-        # delete
+        default.kvstore.get_or_set(imf1)
+        default.kvstore.get_or_set(imf2)
+        self.assertSequenceEqual(snapshot(), [(True, True), (True, True)])
+
+        delete(im1)
         delete(im2, delete_file=False)
-        self.assertFalse(bool(default.kvstore.get(ImageFile(im2))))
-        self.assertTrue(ImageFile(im2).exists())
+        self.assertSequenceEqual(snapshot(), [(False, False), (False, True)])
 
 
 @override_settings(THUMBNAIL_PRESERVE_FORMAT=True, THUMBNAIL_FORMAT="XXX")
 class PreserveFormatTest(TestCase):
+    FORMATS = (
+        ("foo.jpg", "JPEG"),
+        ("foo.jpeg", "JPEG"),
+        ("foo.png", "PNG"),
+        ("foo.gif", "GIF"),
+        ("foo.avif", "AVIF"),
+        # double extension
+        ("foo.ext.avif", "AVIF"),
+        # capitalization doesn't matter
+        ("foo.AVIF", "AVIF"),
+        # fallback format
+        ("foo.txt", "XXX"),
+        ("你好.avif", "AVIF"),
+        # remote url
+        ("http://example.com/1.avif", "AVIF"),
+    )
+
     def setUp(self):
         self.backend = ThumbnailBackend()
 
-    def test_with_various_formats(self):
-        self.assertEqual(self.backend._get_format(FakeFile("foo.jpg")), "JPEG")
-        self.assertEqual(self.backend._get_format(FakeFile("foo.jpeg")), "JPEG")
-        self.assertEqual(self.backend._get_format(FakeFile("foo.png")), "PNG")
-        self.assertEqual(self.backend._get_format(FakeFile("foo.gif")), "GIF")
-        self.assertEqual(self.backend._get_format(FakeFile("foo.avif")), "AVIF")
-
-    def test_double_extension(self):
-        self.assertEqual(self.backend._get_format(FakeFile("foo.ext.avif")), "AVIF")
-
-    def test_that_capitalization_doesnt_matter(self):
-        self.assertEqual(self.backend._get_format(FakeFile("foo.AVIF")), "AVIF")
+    def test_formats(self):
+        for name, expected in self.FORMATS:
+            with self.subTest(name=name):
+                self.assertEqual(self.backend._get_format(FakeFile(name)), expected)
 
-    def test_fallback_format(self):
-        self.assertEqual(self.backend._get_format(FakeFile("foo.txt")), "XXX")
-
-    def test_with_nonascii(self):
-        self.assertEqual(self.backend._get_format(FakeFile("你好.avif")), "AVIF")
-
-    def test_image_remote_url(self):
-        self.assertEqual(
-            self.backend._get_format(FakeFile("http://example.com/1.avif")), "AVIF"
-        )
+    def test_image_file_ext(self):
+        image = AvifImageFile("foo.ext.AVIF")
+        self.assertEqual(image.ext, ".avif")
+        # the extension AvifImageFile worked out is used as is
+        with mock.patch(
+            "sorl.thumbnail.base.ThumbnailBackend.file_extension"
+        ) as file_extension:
+            self.assertEqual(self.backend._get_format(image), "AVIF")
+        file_extension.assert_not_called()
 
 
 @pytest.mark.skipif(
@@ -87,17 +105,21 @@ class TestDescriptors(unittest.TestCase):
     """Make sure we're not leaving open descriptors on file exceptions"""
 
     ENGINE = None
+    NO_SOURCE = None
+    THUMB_DEST = None
 
-    def setUp(self):
-        self.ENGINE = get_module_class(settings.THUMBNAIL_ENGINE)()
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.ENGINE = get_module_class(settings.THUMBNAIL_ENGINE)()
+        cls.NO_SOURCE = ImageFile("nonexistent.jpeg")
+        cls.THUMB_DEST = ImageFile("whatever_thumb.avif", default.storage)
 
     def test_no_source_get_image(self):
         """If source image does not exists, properly close all file descriptors"""
-        source = ImageFile("nonexistent.jpeg")
-
         with same_open_fd_count(self):
             with self.assertRaises(IOError):
-                self.ENGINE.get_image(source)
+                self.ENGINE.get_image(self.NO_SOURCE)
 
     def test_is_valid_image(self):
         with same_open_fd_count(self):
@@ -110,19 +132,23 @@ class TestDescriptors(unittest.TestCase):
     )
     def test_write(self):
         with same_open_fd_count(self):
-            with self.assertRaises(Exception):
-                self.ENGINE.write(
-                    image=self.ENGINE.get_image(StringIO(b"xxx")),
-                    options={"format": "AVIF", "quality": 90, "image_info": {}},
-                    thumbnail=ImageFile("whatever_thumb.avif", default.storage),
-                )
+            buffer = BytesIO(b"xxx")
+            try:
+                with self.assertRaises(Exception):
+                    self.ENGINE.write(
+                        image=self.ENGINE.get_image(buffer),
+                        options={"format": "AVIF", "quality": 90, "image_info": {}},
+                        thumbnail=self.THUMB_DEST,
+                    )
+            finally:
+                buffer.close()
 
 
 class ModelTestCase(BaseTestCase):
     @pytest.mark.django_db
     def test_field1(self):
         self.KVSTORE.clear()
-        item = Item.objects.get(image="100x100.avif")
+        item = self.items["100x100.avif"]
         im = ImageFile(item.image)
         self.assertEqual(None, self.KVSTORE.get(im))
         self.BACKEND.get_thumbnail(im, "27x27")
@@ -131,17 +157,182 @@ class ModelTestCase(BaseTestCase):
         self.assertEqual(3, len(list(self.KVSTORE._find_keys(identity="image"))))
         self.assertEqual(1, len(list(self.KVSTORE._find_keys(identity="thumbnails"))))
 
+    @pytest.mark.django_db
+    def test_get_thumbnails(self):
+        self.KVSTORE.clear()
+        # the cache outlives the rolled back db rows of earlier tests
+        self.KVSTORE.cache.clear()
+        item = self.items["100x100.avif"]
+        im = ImageFile(item.image)
+        with mock.patch.object(
+            AvifEngine, "get_image", autospec=True, side_effect=AvifEngine.get_image
+        ) as get_image:
+            thumbnails = self.BACKEND.get_thumbnails(im, ["27x27", "81x81"])
+        # the source was opened once for both thumbnails
+        self.assertEqual(1, get_image.call_count)
+        self.assertEqual(
+            [
+                self.BACKEND.get_thumbnail(im, "27x27").name,
+                self.BACKEND.get_thumbnail(im, "81x81").name,
+            ],
+            [thumbnail.name for thumbnail in thumbnails],
+        )
+        self.assertEqual(3, len(list(self.KVSTORE._find_keys(identity="image"))))
+        self.assertEqual(1, len(list(self.KVSTORE._find_keys(identity="thumbnails"))))
+
+    @pytest.mark.django_db
+    def test_get_thumbnails_repeated_geometry(self):
+        self.KVSTORE.clear()
+        self.KVSTORE.cache.clear()
+        item = self.items["100x100.avif"]
+        im = ImageFile(item.image)
+        with mock.patch.object(
+            AvifEngine, "get_image", autospec=True, side_effect=AvifEngine.get_image
+        ) as get_image, mock.patch.object(
+            AvifEngine, "write", autospec=True, side_effect=AvifEngine.write
+        ) as write:
+            first, second = self.BACKEND.get_thumbnails(im, ["27x27", "27x27"])
+        self.assertIs(first, second)
+        self.assertEqual(1, get_image.call_count)
+        self.assertEqual(1, write.call_count)
+        # no renamed copy was written next to it
+        cache_dir = os.path.join(settings.MEDIA_ROOT, settings.THUMBNAIL_PREFIX)
+        self.assertEqual([os.path.basename(first.name)], os.listdir(cache_dir))
+
+    @pytest.mark.django_db
+    def test_get_thumbnails_source_error(self):
+        self.KVSTORE.clear()
+        self.KVSTORE.cache.clear()
+        item = self.items["100x100.avif"]
+        im = ImageFile(item.image)
+        existing = self.BACKEND.get_thumbnail(im, "27x27")
+        # in storage, but no longer in the kvstore
+        self.KVSTORE.delete(existing, delete_thumbnails=False)
+
+        original = AvifEngine.get_image
+
+        def get_image(engine, source):
+            if source.name == im.name:
+                raise OSError("source cannot be opened")
+            return original(engine, source)
+
+        with mock.patch.object(
+            AvifEngine, "get_image", autospec=True, side_effect=get_image
+        ):
+            first, second = self.BACKEND.get_thumbnails(im, ["27x27", "81x81"])
+        self.assertEqual(existing.name, first.name)
+        self.assertIsNotNone(self.KVSTORE.get(first))
+        self.assertFalse(second.exists())
+        self.assertIsNone(self.KVSTORE.get(second))
+
+
+class StockBackend(SorlThumbnailBackend):
+    """sorl's own get_thumbnail, with the AVIF aware naming of AvifThumbnail"""
+
+    file_extension = ThumbnailBackend.file_extension
+    _get_format = ThumbnailBackend._get_format
+    _get_thumbnail_filename = ThumbnailBackend._get_thumbnail_filename
+
+
+@pytest.mark.django_db
+class StockBackendParityTest(BaseTestCase):
+    """AvifThumbnail.get_thumbnail behaves like sorl's get_thumbnail"""
+
+    def reset(self):
+        self.KVSTORE.clear()
+        self.KVSTORE.cache.clear()
+        shutil.rmtree(
+            os.path.join(settings.MEDIA_ROOT, settings.THUMBNAIL_PREFIX),
+            ignore_errors=True,
+        )
+
+    def describe(self, thumbnail):
+        return (
+            thumbnail.__class__.__name__ == "DummyImageFile",
+            thumbnail.name if hasattr(thumbnail, "name") else thumbnail.url,
+            thumbnail.size,
+            bool(self.KVSTORE.get(thumbnail)) if hasattr(thumbnail, "key") else None,
+        )
+
+    def compare(self, run):
+        results = []
+        for backend in (StockBackend(), self.BACKEND):
+            self.reset()
+            results.append(run(backend))
+        self.assertEqual(results[0], results[1])
+
+    def test_falsey_file(self):
+        with self.assertRaisesRegex(ValueError, r"get_thumbnail\(\)"):
+            self.BACKEND.get_thumbnail(None, "50x50")
+
+    @override_settings(THUMBNAIL_DUMMY=True)
+    def test_dummy(self):
+        self.compare(
+            lambda backend: self.describe(
+                backend.get_thumbnail("nonexistent.avif", "50x50")
+            )
+        )
+
+    def test_missing_source(self):
+        self.compare(
+            lambda backend: self.describe(
+                backend.get_thumbnail("nonexistent.avif", "50x50")
+            )
+        )
+
+    def test_force_overwrite(self):
+        im = ImageFile(self.items["100x100.avif"].image)
+        cache_dir = os.path.join(settings.MEDIA_ROOT, settings.THUMBNAIL_PREFIX)
+
+        def run(backend):
+            backend.get_thumbnail(im, "50x50")
+            # in storage, but no longer in the kvstore
+            self.KVSTORE.clear()
+            self.KVSTORE.cache.clear()
+            with override_settings(THUMBNAIL_FORCE_OVERWRITE=True):
+                thumbnail = backend.get_thumbnail(im, "50x50")
+            # the storage does not overwrite, the random suffix it adds differs
+            return [
+                re.sub(r"_\w{7}\.avif$", "_<random>.avif", str(value))
+                for value in (*self.describe(thumbnail), *sorted(os.listdir(cache_dir)))
+            ]
+
+        self.compare(run)
+
+
+class RequestCacheTestCase(AvifKVStoreMixin, BaseTestCase):
+    @pytest.mark.django_db
+    def test_request_cache_dedupes_raw_lookups(self):
+        self.KVSTORE.clear()
+        # the cache outlives the rolled back db rows of earlier tests
+        self.KVSTORE.cache.clear()
+        item = self.items["100x100.avif"]
+        im = ImageFile(item.image)
+        with request_cache(), mock.patch.object(
+            KVStore, "_get_raw", autospec=True, side_effect=KVStore._get_raw
+        ) as get_raw:
+            self.assertEqual(None, self.KVSTORE.get(im))
+            self.BACKEND.get_thumbnail(im, "27x27")
+            self.BACKEND.get_thumbnail(im, "81x81")
+            self.assertNotEqual(None, self.KVSTORE.get(im))
+        # every key was fetched from the cache/db at most once
+        keys = [call.args[1] for call in get_raw.call_args_list]
+        self.assertEqual(len(keys), len(set(keys)))
+
 
 class TestInputCase(unittest.TestCase):
     def setUp(self):
-        if not os.path.exists(settings.MEDIA_ROOT):
-            os.makedirs(settings.MEDIA_ROOT)
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self._override = override_settings(MEDIA_ROOT=self._tmp.name)
+        self._override.enable()
+        self.addCleanup(self._override.disable)
 
         self.name = "åäö.avif"
 
         fn = os.path.join(settings.MEDIA_ROOT, self.name)
-        im = Image.new("L", (666, 666))
-        im.save(fn)
+        with open(fn, "wb") as f:
+            f.write(INPUT_IMAGE)
 
     @pytest.mark.django_db
     def test_nonascii(self):
@@ -150,6 +341,3 @@ class TestInputCase(unittest.TestCase):
         self.assertEqual(
             th.url, "/media/test/cache/0bf70bf7dd2648ba45b689dc0c5eb251de0b.avif"
         )
-
-    def tearDown(self):
-        shutil.rmtree(settings.MEDIA_ROOT)
@@ -1,5 +1,7 @@
 import os
 import unittest
+from io import BytesIO
+from unittest import mock
 
 import pytest
 from django.core.files.storage import default_storage
@@ -16,6 +18,7 @@ from sorl.thumbnail.parsers import parse_geometry
 from sorl.thumbnail.templatetags.thumbnail import margin
 
 from sorl_thumbnail_avif.thumbnail.engines import AvifEngine as PILEngine
+from sorl_thumbnail_avif.thumbnail.engines.pil_engine import _register_avif
 
 from .models import Item
 from .utils import BaseTestCase
@@ -535,3 +538,40 @@ class ImageValidationTestCase(unittest.TestCase):
                 ratio = default.engine.get_image_ratio(im, options)
                 geometry = parse_geometry("120x120", ratio)
                 default.engine.create(im, geometry, options)
+
+
+class AvifRegistrationTestCase(unittest.TestCase):
+    """The AVIF plugin is registered by the engine when first needed"""
+
+    OPTIONS = {"quality": 90, "image_info": {}}
+
+    def setUp(self):
+        self.engine = PILEngine()
+        self.image = Image.new("L", (10, 10))
+        buffer = BytesIO()
+        self.image.save(buffer, format="AVIF")
+        self.data = buffer.getvalue()
+        _register_avif.cache_clear()
+
+    def is_registered(self):
+        return _register_avif.cache_info().currsize == 1
+
+    def test_get_image(self):
+        self.engine.get_image(BytesIO(self.data))
+        self.assertTrue(self.is_registered())
+
+    def test_is_valid_image(self):
+        self.engine.is_valid_image(self.data)
+        self.assertTrue(self.is_registered())
+
+    def test_write(self):
+        thumbnail = mock.Mock()
+        self.engine.write(self.image, dict(self.OPTIONS, format="AVIF"), thumbnail)
+        thumbnail.write.assert_called_once()
+        self.assertTrue(self.is_registered())
+
+    def test_write_other_format(self):
+        thumbnail = mock.Mock()
+        self.engine.write(self.image, dict(self.OPTIONS, format="PNG"), thumbnail)
+        thumbnail.write.assert_called_once()
+        self.assertFalse(self.is_registered())
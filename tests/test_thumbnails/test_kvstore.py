@@ -1,8 +1,17 @@
 import threading
 import unittest
+from unittest import mock
 
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from sorl.thumbnail.images import ImageFile
 from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
 
+from sorl_thumbnail_avif.thumbnail.kvstores import AvifKVStore
+from sorl_thumbnail_avif.thumbnail.middleware import KVStoreRequestCacheMiddleware
+
 
 class KVStoreTestCase(unittest.TestCase):
     @unittest.skipIf(threading is None, "Test requires threading")
@@ -20,3 +29,45 @@ class KVStoreTestCase(unittest.TestCase):
 
         # Cache backend for each thread needs to be unique
         self.assertNotEqual(cache_backends[0], cache_backends[1])
+
+
+@pytest.mark.django_db
+class GetManyTestCase(unittest.TestCase):
+    def test_get_many(self):
+        kv = AvifKVStore()
+        im1 = ImageFile("100x100.avif")
+        im2 = ImageFile("500x500.avif")
+        im1.set_size((100, 100))
+        kv.clear()
+        kv.set(im1)
+        kv.cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = kv.get_many([im1, im2])
+        self.assertEqual(1, len(queries))
+        self.assertEqual(im1.name, cached[im1.key].name)
+        self.assertIsNone(cached[im2.key])
+
+        # both results, found or not, are now served from the cache
+        with CaptureQueriesContext(connection) as queries:
+            cached = kv.get_many([im1, im2])
+        self.assertEqual(0, len(queries))
+        self.assertIsNone(cached[im2.key])
+
+
+@pytest.mark.django_db
+class RequestCacheMiddlewareTestCase(unittest.TestCase):
+    def test_request_cache_middleware(self):
+        kv = AvifKVStore()
+        im = ImageFile("100x100.avif")
+
+        def get_response(request):
+            kv.get(im)
+            kv.get(im)
+
+        middleware = KVStoreRequestCacheMiddleware(get_response)
+        with mock.patch.object(
+            KVStore, "_get_raw", autospec=True, side_effect=KVStore._get_raw
+        ) as get_raw:
+            middleware(None)
+        self.assertEqual(1, get_raw.call_count)
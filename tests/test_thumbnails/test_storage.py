@@ -7,6 +7,8 @@ import pytest
 from sorl.thumbnail import default, get_thumbnail
 from sorl.thumbnail.helpers import get_module_class
 
+from sorl_thumbnail_avif.thumbnail.images import AvifImageFile
+
 from .utils import BaseStorageTestCase
 
 
@@ -42,6 +44,25 @@ class StorageTestCase(BaseStorageTestCase):
         self.assertIsNotNone(im.y)
         self.assertEqual(self.log, [])
 
+    @override_settings(THUMBNAIL_EXISTS_LOCAL_FIRST=True)
+    def test_exists_local_first(self):
+        self.assertTrue(AvifImageFile(self.name).exists())
+        self.assertFalse(AvifImageFile("missing.avif").exists())
+        self.assertEqual(self.log, [])  # storage.exists was not asked
+
+    @override_settings(THUMBNAIL_EXISTS_LOCAL_FIRST=True)
+    def test_new_local_first(self):
+        th = get_thumbnail(self.image, "60x60")
+        actions = [
+            # no storage exists() check for the thumbnail
+            "open: org.avif",
+            "save: %s" % th.name,
+            "get_available_name: %s" % th.name,
+            # called by get_available_name
+            "exists: %s" % th.name,
+        ]
+        self.assertEqual(self.log, actions)
+
     @override_settings(THUMBNAIL_STORAGE="tests.test_thumbnails.storage.TestStorage")
     def test_storage_setting_as_path_to_class(self):
         storage = default.Storage()
@@ -1,3 +1,4 @@
+import functools
 import logging
 import os
 import shutil
@@ -5,11 +6,15 @@ import unittest
 from contextlib import contextmanager
 from subprocess import check_output
 
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.test.utils import override_settings
+from django.utils.functional import empty
 from PIL import Image, ImageDraw
 import pillow_avif  # noqa: F401
 
 from sorl.thumbnail.conf import settings
-from sorl.thumbnail.helpers import get_module_class
+from sorl.thumbnail import default, helpers
 from sorl.thumbnail.images import ImageFile
 from sorl.thumbnail.log import ThumbnailLogHandler
 
@@ -23,6 +28,13 @@ handler.setLevel(logging.ERROR)
 logging.getLogger("sorl.thumbnail").addHandler(handler)
 
 
+@receiver(setting_changed)
+def reset_kvstore(setting, **kwargs):
+    # sorl builds default.kvstore once, rebuild it for the overridden class
+    if setting == "THUMBNAIL_KVSTORE":
+        default.kvstore._wrapped = empty
+
+
 @contextmanager
 def same_open_fd_count(testcase):
     num_opened_fd_before = get_open_fds_count()
@@ -53,6 +65,12 @@ def get_open_fds_count():
     return nprocs
 
 
+@functools.lru_cache(maxsize=None)
+def get_module_class(class_path):
+    """Cached ``sorl.thumbnail.helpers.get_module_class``, looked up on every setUp"""
+    return helpers.get_module_class(class_path)
+
+
 class FakeFile:
     """
     Used to test the _get_format method.
@@ -100,24 +118,42 @@ class BaseTestCase(unittest.TestCase):
         self.ENGINE = get_module_class(settings.THUMBNAIL_ENGINE)()
         self.KVSTORE = get_module_class(settings.THUMBNAIL_KVSTORE)()
 
-        if not os.path.exists(settings.MEDIA_ROOT):
+        try:
             os.makedirs(settings.MEDIA_ROOT)
+        except FileExistsError:
+            pass
+        else:
             shutil.copytree(settings.DATA_ROOT, DATA_DIR)
 
+        self.items = {}
         for dimension in self.IMAGE_DIMENSIONS:
             name = "%sx%s.avif" % dimension
-            self.create_image(name, dimension)
+            self.items[name], _ = self.create_image(name, dimension)
 
     def tearDown(self):
         shutil.rmtree(settings.MEDIA_ROOT)
 
 
+class AvifKVStoreMixin:
+    """
+    Runs the tests on ``AvifKVStore`` instead of the configured kvstore.
+    """
+
+    def setUp(self):
+        override = override_settings(
+            THUMBNAIL_KVSTORE="sorl_thumbnail_avif.thumbnail.kvstores.AvifKVStore"
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        super().setUp()
+
+
 class BaseStorageTestCase(unittest.TestCase):
     image = None
     name = None
 
     def setUp(self):
-        os.makedirs(settings.MEDIA_ROOT)
+        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
         filename = os.path.join(settings.MEDIA_ROOT, self.name)
         Image.new("L", (100, 100)).save(filename)
         self.image = ImageFile(self.name)